@@ -6,9 +6,10 @@
     :license: BSD, see LICENSE for more details.
 """
 from trytond.pool import Pool
-from account import AccountJournal, AccountMove, AccountMoveLine
+from account import AccountJournal, AccountMove, AccountMoveLine, Property
 from check import Check, CheckPrinting, CheckPrintingWizard, \
-    CheckPrintingWizardStart, RunCheck, RunCheckStart
+    CheckPrintingWizardStart, RunCheck, RunCheckStart, VoidCheck, \
+    VoidCheckStart, ClearCheck, ClearCheckStart, ClearCheckResult, CheckAudit
 
 
 def register():
@@ -17,7 +18,12 @@ def register():
         AccountMove,
         CheckPrintingWizardStart,
         RunCheckStart,
+        VoidCheckStart,
+        ClearCheckStart,
+        ClearCheckResult,
+        CheckAudit,
         AccountMoveLine,
+        Property,
         module='account_check', type_='model'
     )
     Pool.register(
@@ -28,5 +34,7 @@ def register():
     Pool.register(
         CheckPrintingWizard,
         RunCheck,
+        VoidCheck,
+        ClearCheck,
         module='account_check', type_='wizard'
     )
@@ -5,13 +5,37 @@
     :copyright: (c) 2014 by Openlabs Technologies & Consulting (P) Limited
     :license: BSD, see LICENSE for more details.
 """
+import re
+from collections import namedtuple, OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from sql import Null, For, Table
+from sql.aggregate import Sum
+from sql.conditionals import Coalesce
+from sql.functions import CurrentTimestamp
+
+from trytond import backend
 from trytond.pool import Pool, PoolMeta
 from trytond.model import fields, ModelView
 from trytond.pyson import Eval
+from trytond.cache import Cache
+from trytond.transaction import Transaction
+from trytond.tools import reduce_ids
 
 
 __metaclass__ = PoolMeta
-__all__ = ['AccountJournal', 'AccountMove', 'AccountMoveLine']
+__all__ = ['AccountJournal', 'AccountMove', 'AccountMoveLine', 'Property']
+
+#: Largest numeric part of a check number stored in check_number_value,
+#: which is a 4 bytes integer column.
+CHECK_NUMBER_VALUE_MAX = 2 ** 31 - 1
+
+#: Immutable snapshot of the check related configuration of a journal.
+#: Many2One values are stored as ids.
+CheckConfiguration = namedtuple('CheckConfiguration', [
+    'journal', 'type', 'enable_check_printing', 'check_number_sequence',
+    'check_template', 'credit_account',
+])
 
 
 class AccountJournal:
@@ -39,10 +63,86 @@ class AccountJournal:
         }, depends=['enable_check_printing']
     )
 
+    # The key is built from the journal and the company, the rest of the
+    # context (active_ids, ...) must not be part of it
+    _check_configuration_cache = Cache(
+        'account_journal.check_configuration', context=False
+    )
+
     @staticmethod
     def default_enable_check_printing():
         return False
 
+    @classmethod
+    def get_check_configurations(cls, journal_ids):
+        """
+        Return a dictionary mapping each journal id to its
+        CheckConfiguration. Journals missing from the cache are read in
+        a single query.
+
+        :param journal_ids: List of journal ids
+        """
+        company = Transaction().context.get('company')
+
+        configurations = {}
+        missing = []
+        for journal_id in set(map(int, journal_ids)):
+            configuration = cls._check_configuration_cache.get(
+                (journal_id, company)
+            )
+            if configuration is None:
+                missing.append(journal_id)
+            else:
+                configurations[journal_id] = configuration
+
+        if missing:
+            for values in cls.read(missing, [
+                'type', 'enable_check_printing', 'check_number_sequence',
+                'check_template', 'credit_account',
+            ]):
+                configuration = CheckConfiguration(
+                    journal=values['id'],
+                    type=values['type'],
+                    enable_check_printing=bool(
+                        values['enable_check_printing']
+                    ),
+                    check_number_sequence=values['check_number_sequence'],
+                    check_template=values['check_template'],
+                    credit_account=values['credit_account'],
+                )
+                cls._check_configuration_cache.set(
+                    (configuration.journal, company), configuration
+                )
+                configurations[configuration.journal] = configuration
+        return configurations
+
+    @classmethod
+    def get_check_configuration(cls, journal_id):
+        """
+        Return the CheckConfiguration of the given journal
+        """
+        return cls.get_check_configurations([journal_id])[int(journal_id)]
+
+    @property
+    def check_configuration(self):
+        return self.get_check_configuration(self.id)
+
+    @classmethod
+    def create(cls, vlist):
+        journals = super(AccountJournal, cls).create(vlist)
+        cls._check_configuration_cache.clear()
+        return journals
+
+    @classmethod
+    def write(cls, *args):
+        super(AccountJournal, cls).write(*args)
+        cls._check_configuration_cache.clear()
+
+    @classmethod
+    def delete(cls, journals):
+        super(AccountJournal, cls).delete(journals)
+        cls._check_configuration_cache.clear()
+
     @classmethod
     def validate(cls, journals):
         """
@@ -77,7 +177,11 @@ class AccountMove:
         'Check Number', states={
             'invisible': ~Eval('enable_check_printing', True),
             'readonly': Eval('state') == 'posted',
-        }, depends=['enable_check_printing']
+        }, depends=['enable_check_printing'], select=True
+    )
+    check_number_value = fields.Integer(
+        'Check Number Value', readonly=True,
+        help="Numeric part of the check number used to audit the sequence"
     )
     check_debit_lines = fields.Function(
         fields.One2Many('account.move.line', None, 'Check Debit Lines'),
@@ -87,6 +191,20 @@ class AccountMove:
         fields.One2Many('account.move.line', None, 'Check Credit Lines'),
         'get_check_lines'
     )
+    check_cleared = fields.Boolean(
+        'Check Cleared', readonly=True, states={
+            'invisible': ~Eval('enable_check_printing', True),
+        }, depends=['enable_check_printing']
+    )
+    check_cleared_date = fields.Date(
+        'Check Cleared Date', readonly=True, states={
+            'invisible': ~Eval('check_cleared', False),
+        }, depends=['check_cleared']
+    )
+    voided_check = fields.Many2One(
+        'account.move', 'Voided Check', readonly=True, select=True,
+        help="The check move which is reversed by this move"
+    )
 
     @classmethod
     def __setup__(cls):
@@ -96,8 +214,117 @@ class AccountMove:
                 'invisible': ~Eval('enable_check_printing', True),
             }
         })
-        if 'check_number' not in cls._check_modify_exclude:
-            cls._check_modify_exclude.append('check_number')
+        for field_name in (
+            'check_number', 'check_number_value', 'check_cleared',
+            'check_cleared_date'
+        ):
+            if field_name not in cls._check_modify_exclude:
+                cls._check_modify_exclude.append(field_name)
+        cls._error_messages.update({
+            'check_not_voidable': (
+                'Check "%s" must be posted and have a check number to be '
+                'voided.'
+            ),
+            'check_already_voided': 'Check "%s" is already voided.',
+            'check_cleared': (
+                'Check "%s" can not be voided as it is already cleared by '
+                'the bank.'
+            ),
+            'check_no_payable_line': (
+                'Check "%s" can not be voided as it has no debit line with '
+                'a party.'
+            ),
+            'void_check_description': 'Void of check %s',
+            'reissue_check_description': 'Reissue of check %s',
+        })
+
+    @classmethod
+    def __register__(cls, module_name):
+        TableHandler = backend.get('TableHandler')
+        cursor = Transaction().cursor
+        move = cls.__table__()
+
+        table = TableHandler(cursor, cls, module_name)
+        fill_check_number_value = not table.column_exist('check_number_value')
+
+        super(AccountMove, cls).__register__(module_name)
+
+        table = TableHandler(cursor, cls, module_name)
+        table.index_action(['journal', 'check_number_value'], 'add')
+
+        # Migration: fill the numeric part of existing check numbers
+        if fill_check_number_value:
+            cursor.execute(*move.select(
+                move.id, move.check_number,
+                where=move.check_number != Null
+            ))
+            values = []
+            for move_id, check_number in cursor.fetchall():
+                value = cls.get_check_number_value(check_number)
+                if value is not None:
+                    values.append([move_id, value])
+            if values:
+                # Load the values in a temporary table and update all the
+                # moves from it with a single query
+                temp_name = 'account_check_number_value_migration'
+                cursor.execute(
+                    'CREATE TEMPORARY TABLE "%s" '
+                    '(id INTEGER PRIMARY KEY, value INTEGER)' % temp_name
+                )
+                temp = Table(temp_name)
+                # Two parameters by row
+                size = cursor.IN_MAX // 2
+                for i in range(0, len(values), size):
+                    cursor.execute(*temp.insert(
+                        columns=[temp.id, temp.value],
+                        values=values[i:i + size]
+                    ))
+                cursor.execute(*move.update(
+                    columns=[move.check_number_value],
+                    values=[temp.select(
+                        temp.value, where=temp.id == move.id
+                    )],
+                    where=move.id.in_(temp.select(temp.id))
+                ))
+                cursor.execute('DROP TABLE "%s"' % temp_name)
+
+    @classmethod
+    def get_check_number_value(cls, check_number):
+        """
+        Return the last group of digits of the check number as an integer
+        or None if there is none or if it does not fit in the column.
+        """
+        value = cls.normalize_check_number(check_number)
+        if isinstance(value, (int, long)) and value <= CHECK_NUMBER_VALUE_MAX:
+            return value
+        return None
+
+    @classmethod
+    def create(cls, vlist):
+        vlist = [v.copy() for v in vlist]
+        for values in vlist:
+            if values.get('check_number'):
+                values['check_number_value'] = cls.get_check_number_value(
+                    values['check_number']
+                )
+        return super(AccountMove, cls).create(vlist)
+
+    @classmethod
+    def write(cls, *args):
+        actions = iter(args)
+        args = []
+        for moves, values in zip(actions, actions):
+            if 'check_number' in values:
+                values = values.copy()
+                values['check_number_value'] = cls.get_check_number_value(
+                    values['check_number']
+                )
+            args.extend((moves, values))
+        super(AccountMove, cls).write(*args)
+
+    @staticmethod
+    def default_check_cleared():
+        return False
 
     @classmethod
     def validate(cls, moves):
@@ -112,10 +339,18 @@ class AccountMove:
         Return True if Journal type is Cash and check printing is
         enabled for that Journal
         """
+        Journal = Pool().get('account.journal')
+
+        # Unsaved moves of on_change calls may not have the field
+        if getattr(self, 'voided_check', None):
+            # Reversing moves of voided checks are not checks themselves
+            return False
         if self.journal:
-            return self.journal.enable_check_printing
+            return Journal.get_check_configuration(
+                self.journal.id
+            ).enable_check_printing
 
-    @fields.depends('journal')
+    @fields.depends('journal', 'voided_check')
     def on_change_journal(self):
         return {
             'enable_check_printing': self.get_enable_check_printing(None),
@@ -128,22 +363,385 @@ class AccountMove:
         Set the check number from the value of check number
         sequence field in the current move's Journal
         """
-        Sequence = Pool().get('ir.sequence')
+        Journal = Pool().get('account.journal')
 
+        configurations = Journal.get_check_configurations(
+            [m.journal.id for m in moves]
+        )
+        moves_by_journal = OrderedDict()
         for move in moves:
-            if not move.enable_check_printing:
+            configuration = configurations[move.journal.id]
+            if not configuration.enable_check_printing or move.voided_check:
                 continue
 
-            if move.journal.check_number_sequence:
-                cls.write([move], {
-                    'check_number': Sequence.get_id(
-                        move.journal.check_number_sequence.id
-                    )
-                })
-            else:
+            if not configuration.check_number_sequence:
                 cls.raise_user_error(
                     "No Sequence defined for Check Number on Journal"
                 )
+            moves_by_journal.setdefault(move.journal.id, []).append(move)
+
+        to_write = []
+        for journal_id, journal_moves in moves_by_journal.iteritems():
+            numbers = cls.reserve_check_numbers(journal_id, len(journal_moves))
+            for move, number in zip(journal_moves, numbers):
+                to_write.extend([[move], {'check_number': number}])
+        if to_write:
+            cls.write(*to_write)
+
+    @classmethod
+    def reserve_check_numbers(cls, journal_id, count):
+        """
+        Reserve count consecutive check numbers from the check number
+        sequence of the journal and return them as a list.
+
+        Incremental sequences are advanced once for the whole batch
+        instead of once per check. Only the row of the sequence is locked
+        and only when it is not backed by a database sequence.
+
+        :param journal_id: ID of the journal
+        :param count: Number of check numbers to reserve
+        """
+        Sequence = Pool().get('ir.sequence')
+        Journal = Pool().get('account.journal')
+
+        sequence_id = Journal.get_check_configuration(
+            journal_id
+        ).check_number_sequence
+        if not sequence_id:
+            cls.raise_user_error(
+                "No Sequence defined for Check Number on Journal"
+            )
+        if not count:
+            return []
+
+        sql_sequence = (
+            backend.name() == 'postgresql' and not Sequence._strict
+        )
+        table = Sequence.__table__()
+        cursor = Transaction().cursor
+        with Transaction().set_user(0):
+            if not sql_sequence and backend.name() != 'sqlite':
+                # Lock only the row of the sequence until the end of the
+                # transaction, before reading the next number
+                cursor.execute(*table.select(
+                    table.id, where=table.id == sequence_id,
+                    for_=For('UPDATE')
+                ))
+            sequence = Sequence(sequence_id)
+            if sequence.type != 'incremental':
+                return [Sequence.get_id(sequence_id) for _ in xrange(count)]
+
+            date = Transaction().context.get('date')
+            prefix = Sequence._process(sequence.prefix, date=date)
+            suffix = Sequence._process(sequence.suffix, date=date)
+            if sql_sequence:
+                # The sequence is backed by a database sequence, take the
+                # numbers from it without locking like get_id does
+                cursor.execute(
+                    'SELECT nextval(%s) FROM generate_series(1, %s)',
+                    (sequence._sql_sequence_name, count)
+                )
+                numbers = sorted(n for n, in cursor.fetchall())
+            else:
+                number_next = sequence.number_next
+                increment = sequence.number_increment
+                Sequence.write([sequence], {
+                    'number_next': number_next + count * increment,
+                })
+                numbers = [
+                    number_next + i * increment for i in xrange(count)
+                ]
+        return [
+            '%s%s%s' % (prefix, '%%0%sd' % sequence.padding % n, suffix)
+            for n in numbers
+        ]
+
+    def get_check_payable_line(self):
+        """
+        Return the line of the check which pays the party
+        """
+        line, = [l for l in self.lines if l.party and l.debit]
+        return line
+
+    def get_check_copy_values(self, date, period_id, reverse=False):
+        """
+        Return the values to create a copy of the check move. The debit
+        and credit of the lines are swapped if reverse is True.
+        """
+        if reverse:
+            error = 'void_check_description'
+        else:
+            error = 'reissue_check_description'
+        return {
+            'journal': self.journal.id,
+            'period': period_id,
+            'date': date,
+            'description': self.raise_user_error(
+                error, (self.check_number,), raise_exception=False
+            ),
+            'voided_check': self.id if reverse else None,
+            'lines': [('create', [{
+                'account': line.account.id,
+                'party': line.party and line.party.id,
+                'debit': line.credit if reverse else line.debit,
+                'credit': line.debit if reverse else line.credit,
+            } for line in self.lines])],
+        }
+
+    @classmethod
+    def check_voidable(cls, moves):
+        """
+        Check if the moves are posted checks which are neither voided nor
+        cleared yet
+        """
+        for move in moves:
+            if (
+                move.state != 'posted' or not move.check_number or
+                not move.enable_check_printing
+            ):
+                cls.raise_user_error('check_not_voidable', (move.rec_name,))
+            if move.check_cleared:
+                cls.raise_user_error('check_cleared', (move.rec_name,))
+            if len([l for l in move.lines if l.party and l.debit]) != 1:
+                cls.raise_user_error(
+                    'check_no_payable_line', (move.rec_name,)
+                )
+        voided = cls.search([('voided_check', 'in', map(int, moves))])
+        if voided:
+            cls.raise_user_error(
+                'check_already_voided', (voided[0].voided_check.rec_name,)
+            )
+
+    @classmethod
+    def void_checks(cls, moves, date=None, reissue=False):
+        """
+        Void the given check moves in bulk.
+
+        A reversing move is created for every check and reconciled with
+        the payable line of the check, so that the lines paid by the
+        check are open again. If reissue is True, a new check move with
+        a new check number is also created and the paid lines are
+        reconciled against it.
+
+        Returns a tuple of the reversing moves and the reissued moves.
+
+        :param moves: List of posted check moves
+        :param date: Date of the reversing and reissued moves
+        :param reissue: Create replacement checks for the voided ones
+        """
+        pool = Pool()
+        Date = pool.get('ir.date')
+        Period = pool.get('account.period')
+        Reconciliation = pool.get('account.move.reconciliation')
+
+        if not moves:
+            return [], []
+        cls.check_voidable(moves)
+
+        if date is None:
+            date = Date.today()
+        period_id = Period.find(
+            Transaction().context.get('company'), date=date
+        )
+
+        reconciliations = set()
+        paid_lines = []
+        vlist = []
+        for move in moves:
+            payable_line = move.get_check_payable_line()
+            reconciliation = payable_line.reconciliation
+            if reconciliation:
+                reconciliations.add(reconciliation)
+            paid_lines.append([
+                l for l in (reconciliation.lines if reconciliation else [])
+                if l != payable_line
+            ])
+
+            vlist.append(move.get_check_copy_values(date, period_id, True))
+            if reissue:
+                vlist.append(move.get_check_copy_values(date, period_id))
+
+        # Undo the reconciliations of all the checks with one delete
+        Reconciliation.delete(list(reconciliations))
+
+        created = cls.create(vlist)
+        cls.post(created)
+
+        if reissue:
+            void_moves, reissued_moves = created[0::2], created[1::2]
+        else:
+            void_moves, reissued_moves = created, []
+
+        to_reconcile = [
+            [move.get_check_payable_line()] + [
+                l for l in void_move.lines if l.party and l.credit
+            ] for move, void_move in zip(moves, void_moves)
+        ]
+        to_reconcile.extend(
+            lines + [reissued_move.get_check_payable_line()]
+            for lines, reissued_move in zip(paid_lines, reissued_moves)
+            if lines
+        )
+        Reconciliation.create([{
+            'lines': [('add', map(int, lines))],
+        } for lines in to_reconcile])
+
+        if reissued_moves:
+            cls.assign_check_number(reissued_moves)
+        return void_moves, reissued_moves
+
+    @classmethod
+    def get_outstanding_checks(cls, journal_ids):
+        """
+        Return an index of the posted checks of the given journals which
+        are neither cleared nor voided, built with a single query.
+
+        The index maps (journal id, normalized check number) to the list
+        of the (move id, amount, check number) of the checks having this
+        key, see normalize_check_number. More than one check for a key
+        means that the check can not be identified from its number.
+
+        :param journal_ids: List of journal ids
+        """
+        Line = Pool().get('account.move.line')
+
+        move = cls.__table__()
+        line = Line.__table__()
+        void = cls.__table__()
+        cursor = Transaction().cursor
+
+        cursor.execute(*move.join(
+            line, condition=line.move == move.id
+        ).select(
+            move.id, move.journal, move.check_number, Sum(line.debit),
+            where=(
+                move.journal.in_(map(int, journal_ids)) &
+                (move.state == 'posted') &
+                (move.check_number != Null) &
+                ~Coalesce(move.check_cleared, False) &
+                ~move.id.in_(void.select(
+                    void.voided_check, where=void.voided_check != Null
+                ))
+            ),
+            group_by=[move.id, move.journal, move.check_number]
+        ))
+
+        index = {}
+        for move_id, journal_id, check_number, amount in cursor.fetchall():
+            key = (journal_id, cls.normalize_check_number(check_number))
+            # Sum of a Numeric column is a float on SQLite
+            index.setdefault(key, []).append(
+                (move_id, Decimal(str(amount or 0)), check_number)
+            )
+        return index
+
+    @staticmethod
+    def normalize_check_number(check_number):
+        """
+        Return the check number in the form used to match checks.
+
+        Banks only know the numeric part of the check number, without
+        the prefix of the sequence and the leading zeros, so the last
+        group of digits is used as an integer. Check numbers without
+        digits are used as is.
+        """
+        check_number = (check_number or '').strip()
+        digits = re.findall(r'\d+', check_number)
+        if digits:
+            return int(digits[-1])
+        return check_number
+
+    @classmethod
+    def match_cleared_checks(cls, journal_id, rows):
+        """
+        Match the rows of a cleared items file against the outstanding
+        checks of the journal in a single pass.
+
+        Returns a tuple of the ids of the matched moves and a list of
+        mismatch descriptions.
+
+        :param journal_id: ID of the journal of the bank account
+        :param rows: Iterable of (check number, amount) rows
+        """
+        outstanding = cls.get_outstanding_checks([journal_id])
+
+        matched = set()
+        move_ids = []
+        mismatches = []
+        for line_no, row in enumerate(rows, 1):
+            if not any(row):
+                continue
+            try:
+                check_number = row[0].strip()
+                amount = Decimal(row[1].strip().replace(',', ''))
+            except (IndexError, InvalidOperation):
+                mismatches.append('Line %d: Invalid line' % line_no)
+                continue
+
+            key = (journal_id, cls.normalize_check_number(check_number))
+            checks = outstanding.get(key, [])
+            if key in matched:
+                mismatches.append(
+                    'Line %d: Check %s is repeated in the file' % (
+                        line_no, check_number
+                    )
+                )
+            elif not checks:
+                mismatches.append(
+                    'Line %d: Check %s is not outstanding' % (
+                        line_no, check_number
+                    )
+                )
+            elif len(checks) > 1:
+                mismatches.append(
+                    'Line %d: Check %s matches several outstanding '
+                    'checks: %s' % (
+                        line_no, check_number,
+                        ', '.join(c[2] for c in checks)
+                    )
+                )
+            elif checks[0][1] != amount:
+                mismatches.append(
+                    'Line %d: Check %s amount %s does not match %s' % (
+                        line_no, check_number, amount, checks[0][1]
+                    )
+                )
+            else:
+                matched.add(key)
+                move_ids.append(checks[0][0])
+        return move_ids, mismatches
+
+    @classmethod
+    def mark_checks_cleared(cls, move_ids, date):
+        """
+        Flag the given check moves as cleared by the bank on the date.
+
+        The moves are updated with one query per slice of ids without
+        loading them, as only the clearing fields are written. As the ORM
+        write is bypassed, the write access on account.move is checked
+        here and moves already loaded in the transaction keep their
+        previous values.
+        """
+        ModelAccess = Pool().get('ir.model.access')
+
+        ModelAccess.check(cls.__name__, 'write')
+
+        move = cls.__table__()
+        cursor = Transaction().cursor
+
+        move_ids = list(move_ids)
+        for i in range(0, len(move_ids), cursor.IN_MAX):
+            sub_ids = move_ids[i:i + cursor.IN_MAX]
+            cursor.execute(*move.update(
+                columns=[
+                    move.check_cleared, move.check_cleared_date,
+                    move.write_uid, move.write_date,
+                ],
+                values=[
+                    True, date, Transaction().user, CurrentTimestamp(),
+                ],
+                where=reduce_ids(move.id, sub_ids)
+            ))
 
     @classmethod
     def check_move_lines(cls, moves):
@@ -161,11 +759,16 @@ class AccountMove:
         Validate if there is only one credit line with Journal's
         default Credit Account
         """
+        Journal = Pool().get('account.journal')
+
+        credit_account = Journal.get_check_configuration(
+            self.journal.id
+        ).credit_account
         if (
             len(
                 filter(
                     lambda l: (
-                        (l.account == self.journal.credit_account) and l.credit
+                        (l.account.id == credit_account) and l.credit
                     ),
                     self.lines
                 )
@@ -216,19 +819,123 @@ class AccountMoveLine:
         searcher='search_check_number'
     )
 
-    def origin_details(self):
+    _model_name_cache = Cache('account_move_line.model_name', context=False)
+
+    @classmethod
+    def get_model_names(cls, models):
         """
-        Returns the origin as a string to print on checks
+        Return a dictionary mapping each model to the name of the model,
+        the names missing from the cache are searched in a single query.
+
+        :param models: List of model names like 'account.invoice'
         """
         Model = Pool().get('ir.model')
 
+        # Model names are translated
+        language = Transaction().language
+
+        names = {}
+        missing = []
+        for model in set(models):
+            name = cls._model_name_cache.get((model, language))
+            if name is None:
+                missing.append(model)
+            else:
+                names[model] = name
+
+        if missing:
+            for model in Model.search([('model', 'in', missing)]):
+                cls._model_name_cache.set((model.model, language), model.name)
+                names[model.model] = model.name
+        return names
+
+    @classmethod
+    def get_origin_details(cls, lines):
+        """
+        Return a dictionary mapping each line id to its origin details,
+        like origin_details, with one read per origin model.
+        """
+        pool = Pool()
+
+        ids_by_model = {}
+        for line in lines:
+            if line.origin and line.origin.id >= 0:
+                ids_by_model.setdefault(line.origin.__name__, set()).add(
+                    line.origin.id
+                )
+
+        model_names = cls.get_model_names(ids_by_model.keys())
+        rec_names = {}
+        for model, ids in ids_by_model.iteritems():
+            for values in pool.get(model).read(list(ids), ['rec_name']):
+                rec_names[(model, values['id'])] = values['rec_name']
+
+        details = {}
+        for line in lines:
+            if line.origin and line.origin.id >= 0:
+                model = line.origin.__name__
+                details[line.id] = "%s, %s" % (
+                    model_names[model], rec_names[(model, line.origin.id)]
+                )
+            else:
+                details[line.id] = None
+        return details
+
+    def origin_details(self):
+        """
+        Returns the origin as a string to print on checks
+        """
         if not self.origin or self.origin.id == -1:
             return None
 
-        model, = Model.search([
-            ('model', '=', self.origin.__name__)
-        ])
-        return "%s, %s" % (model.name, self.origin.rec_name)
+        model = self.origin.__name__
+        return "%s, %s" % (
+            self.get_model_names([model])[model], self.origin.rec_name
+        )
+
+    @classmethod
+    def get_check_eligible_lines(cls, line_ids):
+        """
+        Return the ids of the lines which can be paid by a check: lines
+        with a party on a payable account, which are not reconciled and
+        do not belong to a check move themselves.
+
+        :param line_ids: List of line ids
+        """
+        pool = Pool()
+        Move = pool.get('account.move')
+        Journal = pool.get('account.journal')
+        Account = pool.get('account.account')
+
+        line = cls.__table__()
+        move = Move.__table__()
+        journal = Journal.__table__()
+        account = Account.__table__()
+        cursor = Transaction().cursor
+
+        line_ids = list(line_ids)
+        eligible_ids = set()
+        for i in range(0, len(line_ids), cursor.IN_MAX):
+            sub_ids = line_ids[i:i + cursor.IN_MAX]
+            cursor.execute(*line.join(
+                account, condition=account.id == line.account
+            ).join(
+                move, condition=move.id == line.move
+            ).join(
+                journal, condition=journal.id == move.journal
+            ).select(
+                line.id,
+                where=(
+                    reduce_ids(line.id, sub_ids) &
+                    (line.party != Null) &
+                    (line.reconciliation == Null) &
+                    (account.kind == 'payable') &
+                    (move.check_number == Null) &
+                    ~Coalesce(journal.enable_check_printing, False)
+                )
+            ))
+            eligible_ids.update(l for l, in cursor.fetchall())
+        return eligible_ids
 
     def get_check_number(self, name):
         """
@@ -239,3 +946,51 @@ class AccountMoveLine:
     @classmethod
     def search_check_number(cls, name, clause):
         return [('move.check_number',) + tuple(clause[1:])]
+
+
+class Property:
+    'Property'
+    __name__ = 'ir.property'
+
+    @staticmethod
+    def _in_check_configuration(properties):
+        """
+        Return True if one of the properties is a journal field, like the
+        check number sequence, and so part of the cached check
+        configuration of journals.
+        """
+        Journal = Pool().get('account.journal')
+
+        return any(
+            p.field.model.model == Journal.__name__ for p in properties
+        )
+
+    @classmethod
+    def _clear_check_configuration_cache(cls):
+        Journal = Pool().get('account.journal')
+
+        Journal._check_configuration_cache.clear()
+
+    @classmethod
+    def create(cls, vlist):
+        properties = super(Property, cls).create(vlist)
+        if cls._in_check_configuration(properties):
+            cls._clear_check_configuration_cache()
+        return properties
+
+    @classmethod
+    def write(cls, *args):
+        properties = sum(args[0:None:2], [])
+        # The field of the properties could be changed by the write
+        clear = cls._in_check_configuration(properties)
+        super(Property, cls).write(*args)
+        if clear or cls._in_check_configuration(
+                cls.browse(map(int, properties))):
+            cls._clear_check_configuration_cache()
+
+    @classmethod
+    def delete(cls, properties):
+        clear = cls._in_check_configuration(properties)
+        super(Property, cls).delete(properties)
+        if clear:
+            cls._clear_check_configuration_cache()
@@ -5,22 +5,34 @@
     :copyright: (c) 2014 by Openlabs Technologies & Consulting (P) Limited
     :license: BSD, see LICENSE for more details.
 """
+import csv
+import re
+import zipfile
+from collections import OrderedDict
 from num2words import num2words
 from itertools import groupby
 from decimal import Decimal
+from StringIO import StringIO
+
+from sql import Literal, Null, Window
+from sql.aggregate import Count
+from sql.conditionals import Case, Coalesce
+from sql.functions import CurrentTimestamp, Lag
 
 from trytond.report import Report
 from trytond.exceptions import UserError
 from trytond.pool import Pool
 from trytond.transaction import Transaction
-from trytond.model import fields, ModelView
-from trytond.wizard import Wizard, StateAction, StateView, Button
+from trytond.model import fields, ModelView, ModelSQL
+from trytond.wizard import Wizard, StateAction, StateView, StateTransition, \
+    Button
 from trytond.pyson import PYSONEncoder
 
 
 __all__ = [
     'Check', 'CheckPrinting', 'CheckPrintingWizard', 'CheckPrintingWizardStart',
-    'RunCheck', 'RunCheckStart'
+    'RunCheck', 'RunCheckStart', 'VoidCheck', 'VoidCheckStart',
+    'ClearCheck', 'ClearCheckStart', 'ClearCheckResult', 'CheckAudit'
 ]
 
 
@@ -47,14 +59,76 @@ class ReportMixin(Report):
 
         return ('{:*<%d}' % length).format(amount_in_words)
 
+    @classmethod
+    def prefetch(cls, records):
+        """
+        Load the records related to the checks for the whole batch with a
+        few bulk reads, so that rendering the template does not issue
+        queries for every check.
+
+        Returns the moves browsed together and a dictionary mapping each
+        move id to the details of its check: the debit lines, the party
+        and its address and the origin details of the lines. The
+        template should use these details instead of walking the
+        relations of the moves.
+
+        :param records: List of account moves
+        """
+        pool = Pool()
+        AccountMove = pool.get('account.move')
+        Line = pool.get('account.move.line')
+        Party = pool.get('party.party')
+        Journal = pool.get('account.journal')
+
+        moves = AccountMove.browse(map(int, records))
+        Journal.get_check_configurations([m.journal.id for m in moves])
+
+        lines = Line.browse([l.id for m in moves for l in m.lines])
+        lines_by_id = dict((l.id, l) for l in lines)
+        parties = dict(
+            (p.id, p) for p in Party.browse(
+                list(set(l.party.id for l in lines if l.party))
+            )
+        )
+        origin_details = Line.get_origin_details(lines)
+
+        check_details = {}
+        for move in moves:
+            if move.enable_check_printing:
+                debit_lines = [
+                    lines_by_id[l.id] for l in move.lines if l.debit
+                ]
+            else:
+                debit_lines = []
+            party = None
+            for line in debit_lines:
+                if line.party:
+                    party = parties[line.party.id]
+                    break
+            check_details[move.id] = {
+                'debit_lines': debit_lines,
+                'party': party,
+                'address': (
+                    party.addresses[0] if party and party.addresses
+                    else None
+                ),
+                'origin_details': dict(
+                    (l.id, origin_details[l.id]) for l in move.lines
+                ),
+            }
+        return moves, check_details
+
     @classmethod
     def parse(cls, report, records, data, localcontext):
         """
-        Add amount_to_words to localcontext
+        Add amount_to_words and the prefetched check_details to
+        localcontext
         """
+        records, check_details = cls.prefetch(records)
         localcontext.update({
             'amount_to_words': lambda *args, **kargs: cls.amount_to_words(
-                *args, **kargs)
+                *args, **kargs),
+            'check_details': check_details,
         })
 
         return super(ReportMixin, cls).parse(
@@ -71,6 +145,8 @@ class Check(ReportMixin):
         """
         Replace the report with the report selected in Account Move
         """
+        ActionReport = Pool().get('ir.action.report')
+
         if len(records) > 1:
             raise UserError(
                 "This report can only be generated for 1 record at a time"
@@ -91,7 +167,9 @@ class Check(ReportMixin):
             )
 
         # Use Account Move's check template
-        report = move.journal.check_template
+        report = ActionReport(
+            move.journal.check_configuration.check_template
+        )
         return super(Check, cls).parse(
             report, records, data, localcontext
         )
@@ -105,15 +183,55 @@ class CheckPrinting(ReportMixin):
 
     @classmethod
     def parse(cls, report, records, data, localcontext):
+        """
+        Render the checks of each journal with the check template of the
+        journal. The checks of journals sharing a template are rendered
+        together, when several templates are used the outputs are
+        returned in a single zip file.
+        """
         AccountMove = Pool().get('account.move')
         AccountJournal = Pool().get('account.journal')
+        ActionReport = Pool().get('ir.action.report')
 
-        records = [AccountMove(m) for m in data['moves']]
-        report = AccountJournal(data['journal']).check_template
-        return super(CheckPrinting, cls).parse(
-            report, records, data, localcontext
+        records = AccountMove.browse(data['moves'])
+        configurations = AccountJournal.get_check_configurations(
+            [m.journal.id for m in records]
         )
 
+        records_by_template = OrderedDict()
+        for move in records:
+            template = configurations[move.journal.id].check_template
+            records_by_template.setdefault(template, []).append(move)
+
+        outputs = []
+        for template, template_records in records_by_template.iteritems():
+            outputs.append(
+                super(CheckPrinting, cls).parse(
+                    ActionReport(template), template_records, data,
+                    localcontext.copy()
+                )
+            )
+        if len(outputs) == 1:
+            return outputs[0]
+
+        content = StringIO()
+        with zipfile.ZipFile(content, 'w') as output:
+            for index, template_records in enumerate(
+                    records_by_template.itervalues()):
+                oext, rendered = outputs[index]
+                journals = OrderedDict(
+                    (m.journal.id, m.journal) for m in template_records
+                )
+                # Journal codes could contain path separators
+                name = '-'.join(
+                    re.sub(r'[^\w.-]+', '_', j.code or str(j.id))
+                    for j in journals.itervalues()
+                )
+                output.writestr(
+                    '%d-%s.%s' % (index + 1, name, oext), str(rendered)
+                )
+        return 'zip', content.getvalue()
+
 
 class CheckPrintingWizardStart(ModelView):
     'Check Printing Wizard'
@@ -121,6 +239,10 @@ class CheckPrintingWizardStart(ModelView):
 
     next_number = fields.Integer('Next Number', readonly=True)
     journal = fields.Many2One('account.journal', 'Journal', readonly=True)
+    journals = fields.One2Many(
+        'account.journal', None, 'Journals', readonly=True
+    )
+    next_numbers = fields.Text('Next Numbers', readonly=True)
     no_of_checks = fields.Integer('Number of Checks', readonly=True)
 
 
@@ -142,6 +264,8 @@ class CheckPrintingWizard(Wizard):
         Set values for fields in Start View
         """
         AccountMove = Pool().get('account.move')
+        AccountJournal = Pool().get('account.journal')
+        Sequence = Pool().get('ir.sequence')
 
         defaults = {}
         move_ids = Transaction().context.get('active_ids')
@@ -149,8 +273,8 @@ class CheckPrintingWizard(Wizard):
         if not move_ids:
             self.raise_user_error('No Account Move selected')
 
-        moves = [AccountMove(m) for m in move_ids]
-        journals = set([m.journal for m in moves])
+        moves = AccountMove.browse(move_ids)
+        journal_ids = list(OrderedDict((m.journal.id, None) for m in moves))
 
         if filter(lambda m: m.check_number, moves):
             self.raise_user_error(
@@ -162,21 +286,30 @@ class CheckPrintingWizard(Wizard):
                 'One or more selected moves are not Posted yet.'
             )
 
-        if len(journals) > 1:
-            self.raise_user_error(
-                'All selected moves must be for the same Journal'
-            )
-
-        journal, = journals
-        if not journal.enable_check_printing:
-            self.raise_user_error(
-                'Check printing not enabled for Journal'
-            )
-        if not journal.check_number_sequence:
-            self.raise_user_error('No sequence defined on Journal')
-
-        defaults['next_number'] = journal.check_number_sequence.number_next
-        defaults['journal'] = journal.id
+        configurations = AccountJournal.get_check_configurations(journal_ids)
+        for configuration in configurations.itervalues():
+            if not configuration.enable_check_printing:
+                self.raise_user_error(
+                    'Check printing not enabled for Journal'
+                )
+            if not configuration.check_number_sequence:
+                self.raise_user_error('No sequence defined on Journal')
+
+        next_numbers = OrderedDict()
+        for journal in AccountJournal.browse(journal_ids):
+            next_numbers[journal] = Sequence(
+                configurations[journal.id].check_number_sequence
+            ).number_next
+
+        if len(journal_ids) == 1:
+            (journal, next_number), = next_numbers.items()
+            defaults['next_number'] = next_number
+            defaults['journal'] = journal.id
+        defaults['journals'] = journal_ids
+        defaults['next_numbers'] = '\n'.join(
+            '%s: %s' % (journal.rec_name, next_number)
+            for journal, next_number in next_numbers.iteritems()
+        )
         defaults['no_of_checks'] = len(moves)
         return defaults
 
@@ -187,14 +320,14 @@ class CheckPrintingWizard(Wizard):
         AccountMove = Pool().get('account.move')
 
         move_ids = Transaction().context.get('active_ids')
-        moves = [AccountMove(m) for m in move_ids]
+        moves = AccountMove.browse(move_ids)
 
-        # Assign Check Number to all moves
+        # Assign Check Number to all moves, reserving the numbers once
+        # per journal
         AccountMove.assign_check_number(moves)
 
         data = {
             'moves': move_ids,
-            'journal': self.start.journal.id,
         }
         return action, data
 
@@ -214,13 +347,22 @@ class RunCheckStart(ModelView):
     moves = fields.One2Many(
         'account.move', None, 'Moves', readonly=True
     )
+    ineligible_lines = fields.One2Many(
+        'account.move.line', None, 'Ineligible Lines', readonly=True,
+        help="Selected lines which are reconciled, not payable, without "
+        "party or already part of a check and will not be paid"
+    )
 
     @fields.depends('journal')
     def on_change_journal(self):
-        if self.journal:
-            return {
-                'next_number': self.journal.check_number_sequence.number_next
-            }
+        Sequence = Pool().get('ir.sequence')
+
+        if self.journal and self.journal.id >= 0:
+            sequence = self.journal.check_configuration.check_number_sequence
+            if sequence:
+                return {
+                    'next_number': Sequence(sequence).number_next
+                }
         return {'next_number': None}
 
 
@@ -238,6 +380,24 @@ class RunCheck(Wizard):
     pay = StateAction('account_check.account_move_check_printing')
     summary = StateAction('account.act_move_form')
 
+    def default_start(self, fields):
+        """
+        Report the selected lines which cannot be paid by a check
+        """
+        Line = Pool().get('account.move.line')
+
+        line_ids = Transaction().context.get('active_ids') or []
+        eligible_ids = Line.get_check_eligible_lines(line_ids)
+        if not eligible_ids:
+            self.raise_user_error(
+                'None of the selected lines can be paid by a check'
+            )
+        return {
+            'ineligible_lines': [
+                l for l in line_ids if l not in eligible_ids
+            ],
+        }
+
     def get_move(self, lines, party, account):
         Move = Pool().get('account.move')
         Line = Pool().get('account.move.line')
@@ -246,6 +406,7 @@ class RunCheck(Wizard):
         total_debit = sum(line.debit for line in lines)
         total_credit = sum(line.credit for line in lines)
         payment_amount = total_credit - total_debit
+        credit_account = self.start.journal.check_configuration.credit_account
 
         return Move(
             journal=self.start.journal,
@@ -253,7 +414,7 @@ class RunCheck(Wizard):
             lines=[
                 # Credit the journal
                 Line(
-                    account=self.start.journal.credit_account,
+                    account=credit_account,
                     credit=payment_amount,
                 ),
                 # Debit the payable account
@@ -271,12 +432,11 @@ class RunCheck(Wizard):
 
         sort_key = lambda line: (line.party, line.account)
 
-        # Sorted by party after removing lines without party
+        # Sorted by party after removing lines which cannot be paid
         move_lines = sorted(
-            filter(
-                lambda line: line.party,
-                Line.browse(Transaction().context['active_ids'])
-            ),
+            Line.browse(list(Line.get_check_eligible_lines(
+                Transaction().context['active_ids']
+            ))),
             key=sort_key
         )
 
@@ -302,7 +462,6 @@ class RunCheck(Wizard):
 
         data = {
             'moves': move_ids,
-            'journal': self.start.journal.id,
         }
         return action, data
 
@@ -315,3 +474,227 @@ class RunCheck(Wizard):
         )
         action['name'] = "Moves for Created Checks"
         return action, {}
+
+
+class VoidCheckStart(ModelView):
+    'Void Checks'
+    __name__ = 'account.move.void_check.start'
+
+    date = fields.Date('Date', required=True)
+    reissue = fields.Boolean(
+        'Reissue', help="Create new checks to replace the voided checks"
+    )
+    no_of_checks = fields.Integer('Number of Checks', readonly=True)
+    moves = fields.One2Many(
+        'account.move', None, 'Moves', readonly=True
+    )
+
+    @staticmethod
+    def default_date():
+        return Pool().get('ir.date').today()
+
+    @staticmethod
+    def default_reissue():
+        return False
+
+
+class VoidCheck(Wizard):
+    'Void checks for the given moves'
+    __name__ = 'account.move.void_check'
+
+    start = StateView(
+        'account.move.void_check.start',
+        'account_check.void_check_start_view_form', [
+            Button('Cancel', 'end', 'tryton-cancel'),
+            Button('Void', 'void', 'tryton-ok', default=True),
+        ]
+    )
+    void = StateAction('account.act_move_form')
+
+    def default_start(self, fields):
+        """
+        Set values for fields in Start View
+        """
+        AccountMove = Pool().get('account.move')
+
+        move_ids = Transaction().context.get('active_ids')
+        if not move_ids:
+            self.raise_user_error('No Account Move selected')
+
+        AccountMove.check_voidable(AccountMove.browse(move_ids))
+        return {
+            'no_of_checks': len(move_ids),
+        }
+
+    def do_void(self, action):
+        AccountMove = Pool().get('account.move')
+
+        void_moves, reissued_moves = AccountMove.void_checks(
+            AccountMove.browse(Transaction().context['active_ids']),
+            date=self.start.date, reissue=self.start.reissue
+        )
+        self.start.moves = void_moves + reissued_moves
+
+        action['pyson_domain'] = PYSONEncoder().encode(
+            [('id', 'in', map(int, self.start.moves))]
+        )
+        action['name'] = "Moves for Voided Checks"
+        return action, {}
+
+
+class ClearCheckStart(ModelView):
+    'Clear Checks'
+    __name__ = 'account.move.clear_check.start'
+
+    journal = fields.Many2One(
+        'account.journal', 'Journal', required=True, domain=[
+            ('enable_check_printing', '=', True)
+        ]
+    )
+    date = fields.Date('Cleared Date', required=True)
+    file = fields.Binary(
+        'Cleared Items File', required=True,
+        help="CSV file from the bank with the check number in the first "
+        "column and the amount in the second column"
+    )
+
+    @staticmethod
+    def default_date():
+        return Pool().get('ir.date').today()
+
+
+class ClearCheckResult(ModelView):
+    'Clear Checks'
+    __name__ = 'account.move.clear_check.result'
+
+    matched = fields.Integer('Cleared Checks', readonly=True)
+    mismatches = fields.Text('Mismatches', readonly=True)
+
+
+class ClearCheck(Wizard):
+    'Clear checks from the cleared items file of the bank'
+    __name__ = 'account.move.clear_check'
+
+    start = StateView(
+        'account.move.clear_check.start',
+        'account_check.clear_check_start_view_form', [
+            Button('Cancel', 'end', 'tryton-cancel'),
+            Button('Import', 'import_', 'tryton-ok', default=True),
+        ]
+    )
+    import_ = StateTransition()
+    result = StateView(
+        'account.move.clear_check.result',
+        'account_check.clear_check_result_view_form', [
+            Button('Close', 'end', 'tryton-close', default=True),
+        ]
+    )
+
+    def transition_import_(self):
+        AccountMove = Pool().get('account.move')
+
+        rows = csv.reader(StringIO(str(self.start.file)))
+        move_ids, mismatches = AccountMove.match_cleared_checks(
+            self.start.journal.id, rows
+        )
+        AccountMove.mark_checks_cleared(move_ids, self.start.date)
+
+        self.result.matched = len(move_ids)
+        self.result.mismatches = '\n'.join(mismatches)
+        return 'result'
+
+    def default_result(self, fields):
+        return {
+            'matched': self.result.matched,
+            'mismatches': self.result.mismatches,
+        }
+
+
+class CheckAudit(ModelSQL, ModelView):
+    'Check Number Audit'
+    __name__ = 'account.move.check_audit'
+
+    move = fields.Many2One('account.move', 'Move', readonly=True)
+    journal = fields.Many2One('account.journal', 'Journal', readonly=True)
+    date = fields.Date('Date', readonly=True)
+    check_number = fields.Char('Check Number', readonly=True)
+    check_number_value = fields.Integer('Check Number Value', readonly=True)
+    previous_number = fields.Integer(
+        'Previous Number', readonly=True,
+        help="Previous check number of the journal in numeric order"
+    )
+    missing = fields.Integer(
+        'Missing Numbers', readonly=True,
+        help="Count of check numbers missing before this check"
+    )
+    duplicates = fields.Integer(
+        'Occurrences', readonly=True,
+        help="Count of checks of the journal with the same number"
+    )
+    out_of_sequence = fields.Boolean(
+        'Out of Sequence', readonly=True,
+        help="The check number is lower than the number of the check "
+        "issued before it on the journal"
+    )
+
+    @classmethod
+    def __setup__(cls):
+        super(CheckAudit, cls).__setup__()
+        cls._order.insert(0, ('journal', 'ASC'))
+        cls._order.insert(1, ('check_number_value', 'ASC'))
+
+    @staticmethod
+    def table_query():
+        """
+        Return the checks having a gap before them, a duplicate number or
+        a number lower than the one of the previously issued check of the
+        journal, computed with window functions over the indexed numeric
+        value of the check numbers.
+
+        Window functions require SQLite 3.25 or later on SQLite.
+        """
+        Move = Pool().get('account.move')
+
+        move = Move.__table__()
+        by_number = Window(
+            [move.journal],
+            order_by=[move.check_number_value.asc, move.id.asc]
+        )
+        by_issue = Window([move.journal], order_by=[move.id.asc])
+        by_value = Window([move.journal, move.check_number_value])
+
+        checks = move.select(
+            move.id, move.journal, move.date, move.check_number,
+            move.check_number_value,
+            Lag(move.check_number_value, window=by_number).as_(
+                'previous_value'
+            ),
+            Lag(move.check_number_value, window=by_issue).as_(
+                'previous_issued_value'
+            ),
+            Count(Literal('*'), window=by_value).as_('occurrences'),
+            where=move.check_number_value != Null
+        )
+        missing = checks.check_number_value - checks.previous_value - 1
+        out_of_sequence = (
+            checks.check_number_value < checks.previous_issued_value
+        )
+        return checks.select(
+            checks.id.as_('id'),
+            Literal(0).as_('create_uid'),
+            CurrentTimestamp().as_('create_date'),
+            Literal(None).as_('write_uid'),
+            Literal(None).as_('write_date'),
+            checks.id.as_('move'),
+            checks.journal.as_('journal'),
+            checks.date.as_('date'),
+            checks.check_number.as_('check_number'),
+            checks.check_number_value.as_('check_number_value'),
+            checks.previous_value.as_('previous_number'),
+            Case((missing > 0, missing), else_=0).as_('missing'),
+            checks.occurrences.as_('duplicates'),
+            Coalesce(out_of_sequence, False).as_('out_of_sequence'),
+            where=(
+                (missing > 0) | (checks.occurrences > 1) | out_of_sequence
+            )
+        )
@@ -81,7 +81,8 @@ major_version = int(major_version)
 minor_version = int(minor_version)
 
 requires = [
-    'num2words'
+    'num2words',
+    'python-sql >= 0.5',
 ]
 
 MODULE2PREFIX = {}
@@ -0,0 +1,871 @@
+# -*- coding: utf-8 -*-
+"""
+    tests/test_check.py
+
+    :copyright: (C) 2014 by Openlabs Technologies & Consulting (P) Limited
+    :license: BSD, see LICENSE for more details.
+"""
+import sys
+import os
+DIR = os.path.abspath(os.path.normpath(os.path.join(
+    __file__, '..', '..', '..', '..', '..', 'trytond'
+)))
+if os.path.isdir(DIR):
+    sys.path.insert(0, os.path.dirname(DIR))
+import unittest
+import datetime
+import sqlite3
+import zipfile
+from decimal import Decimal
+from StringIO import StringIO
+from dateutil.relativedelta import relativedelta
+
+import trytond.tests.test_tryton
+from trytond import backend
+from trytond.tests.test_tryton import POOL, USER, DB_NAME, CONTEXT
+from trytond.transaction import Transaction
+from trytond.exceptions import UserError
+
+# The check number audit uses window functions
+WINDOW_FUNCTIONS = (
+    backend.name() != 'sqlite' or sqlite3.sqlite_version_info >= (3, 25)
+)
+
+
+class TestCheck(unittest.TestCase):
+    '''
+    Test check moves
+    '''
+
+    def setUp(self):
+        """
+        Set up data used in the tests.
+        this method is called before each test function execution.
+        """
+        trytond.tests.test_tryton.install_module('account_check')
+
+        self.Account = POOL.get('account.account')
+        self.Company = POOL.get('company.company')
+        self.Currency = POOL.get('currency.currency')
+        self.FiscalYear = POOL.get('account.fiscalyear')
+        self.Journal = POOL.get('account.journal')
+        self.Line = POOL.get('account.move.line')
+        self.ModelData = POOL.get('ir.model.data')
+        self.Move = POOL.get('account.move')
+        self.Party = POOL.get('party.party')
+        self.Period = POOL.get('account.period')
+        self.Sequence = POOL.get('ir.sequence')
+        self.User = POOL.get('res.user')
+
+    def _create_fiscal_year(self, date=None, company=None):
+        """
+        Creates a fiscal year and requried sequences
+        """
+        if date is None:
+            date = datetime.date.today()
+
+        sequence, = self.Sequence.create([{
+            'name': '%s' % date.year,
+            'code': 'account.move',
+            'company': company,
+        }])
+        fiscal_year, = self.FiscalYear.create([{
+            'name': '%s' % date.year,
+            'start_date': date + relativedelta(month=1, day=1),
+            'end_date': date + relativedelta(month=12, day=31),
+            'company': company,
+            'post_move_sequence': sequence.id,
+        }])
+        self.FiscalYear.create_period([fiscal_year])
+        return fiscal_year
+
+    def _create_coa_minimal(self, company):
+        """
+        Create a minimal chart of accounts
+        """
+        AccountTemplate = POOL.get('account.account.template')
+        account_create_chart = POOL.get(
+            'account.create_chart', type='wizard'
+        )
+
+        account_template, = AccountTemplate.search([
+            ('parent', '=', None),
+        ])
+
+        session_id, _, _ = account_create_chart.create()
+        create_chart = account_create_chart(session_id)
+        create_chart.account.account_template = account_template
+        create_chart.account.company = company
+        create_chart.transition_create_account()
+
+        receivable, = self.Account.search([
+            ('kind', '=', 'receivable'),
+            ('company', '=', company),
+        ])
+        payable, = self.Account.search([
+            ('kind', '=', 'payable'),
+            ('company', '=', company),
+        ])
+        create_chart.properties.company = company
+        create_chart.properties.account_receivable = receivable
+        create_chart.properties.account_payable = payable
+        create_chart.transition_create_properties()
+
+    def _get_account_by_kind(self, kind, company=None):
+        """
+        Returns an account with given spec
+        """
+        accounts = self.Account.search([
+            ('kind', '=', kind),
+            ('company', '=', company or self.company.id),
+        ], limit=1)
+        return accounts[0] if accounts else None
+
+    def setup_defaults(self):
+        """
+        Setup the company, accounts, check journal and supplier
+        """
+        with Transaction().set_context(company=None):
+            company_party, = self.Party.create([{
+                'name': 'Openlabs',
+            }])
+            self.currency, = self.Currency.create([{
+                'name': 'US Dollar',
+                'code': 'USD',
+                'symbol': '$',
+            }])
+            self.company, = self.Company.create([{
+                'party': company_party.id,
+                'currency': self.currency.id,
+            }])
+
+        self.User.write([self.User(USER)], {
+            'main_company': self.company.id,
+            'company': self.company.id,
+        })
+        CONTEXT.update(self.User.get_preferences(context_only=True))
+
+        self._create_fiscal_year(company=self.company.id)
+        self._create_coa_minimal(company=self.company.id)
+
+        self.payable = self._get_account_by_kind('payable')
+        self.expense = self._get_account_by_kind('expense')
+        self.cash = self._get_account_by_kind('other')
+
+        self.check_sequence, = self.Sequence.create([{
+            'name': 'Check Number',
+            'code': 'account.journal',
+        }])
+        self.expense_journal, = self.Journal.search([
+            ('type', '=', 'expense'),
+        ], limit=1)
+        self.cash_journal, = self.Journal.search([
+            ('type', '=', 'cash'),
+        ], limit=1)
+        self.Journal.write([self.cash_journal], {
+            'credit_account': self.cash.id,
+            'debit_account': self.cash.id,
+            'enable_check_printing': True,
+            'check_number_sequence': self.check_sequence.id,
+            'check_template': self.ModelData.get_id(
+                'account_check', 'check_report'
+            ),
+        })
+
+        self.supplier, = self.Party.create([{
+            'name': 'Supplier',
+            'addresses': [('create', [{
+                'name': 'Supplier',
+                'street': '1 Main Street',
+            }])],
+        }])
+
+    def create_payable_line(self, amount=Decimal('100')):
+        """
+        Create and post an expense move and return its payable line
+        """
+        date = datetime.date.today()
+        move, = self.Move.create([{
+            'journal': self.expense_journal.id,
+            'period': self.Period.find(self.company.id, date=date),
+            'date': date,
+            'lines': [('create', [{
+                'account': self.expense.id,
+                'debit': amount,
+                'credit': Decimal('0'),
+            }, {
+                'account': self.payable.id,
+                'party': self.supplier.id,
+                'debit': Decimal('0'),
+                'credit': amount,
+            }])],
+        }])
+        self.Move.post([move])
+        line, = [l for l in move.lines if l.party]
+        return line
+
+    def create_check(
+            self, amount=Decimal('100'), paid_line=None, journal=None,
+            number=True):
+        """
+        Create a posted and numbered check move paying the given line
+        """
+        if journal is None:
+            journal = self.cash_journal
+        date = datetime.date.today()
+        move, = self.Move.create([{
+            'journal': journal.id,
+            'period': self.Period.find(self.company.id, date=date),
+            'date': date,
+            'lines': [('create', [{
+                'account': self.cash.id,
+                'debit': Decimal('0'),
+                'credit': amount,
+            }, {
+                'account': self.payable.id,
+                'party': self.supplier.id,
+                'debit': amount,
+                'credit': Decimal('0'),
+            }])],
+        }])
+        self.Move.post([move])
+        if paid_line:
+            self.Line.reconcile(
+                [paid_line, move.get_check_payable_line()]
+            )
+        if number:
+            self.Move.assign_check_number([move])
+        return self.Move(move.id)
+
+    def test0010reserve_check_numbers(self):
+        """
+        Numbers are reserved in one batch with prefix, padding and
+        increment of the sequence
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                self.Sequence.write([self.check_sequence], {
+                    'prefix': 'CHK-',
+                    'padding': 4,
+                    'number_increment': 2,
+                    'number_next': 5,
+                })
+                self.assertEqual(
+                    self.Move.reserve_check_numbers(self.cash_journal.id, 3),
+                    ['CHK-0005', 'CHK-0007', 'CHK-0009']
+                )
+                self.assertEqual(
+                    self.Sequence(self.check_sequence.id).number_next, 11
+                )
+                self.assertEqual(
+                    self.Move.reserve_check_numbers(self.cash_journal.id, 0), []
+                )
+
+    def test0020void_checks(self):
+        """
+        Voiding checks reverses them and opens the paid lines again
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                paid_lines = [self.create_payable_line() for _ in range(2)]
+                checks = [self.create_check(paid_line=l) for l in paid_lines]
+
+                void_moves, reissued_moves = self.Move.void_checks(checks)
+
+                self.assertEqual(len(void_moves), 2)
+                self.assertEqual(reissued_moves, [])
+                for check, void_move in zip(checks, void_moves):
+                    void_move = self.Move(void_move.id)
+                    self.assertEqual(void_move.voided_check, check)
+                    self.assertEqual(void_move.state, 'posted')
+                    self.assertFalse(void_move.enable_check_printing)
+                    self.assertFalse(void_move.check_number)
+
+                    payable_line = check.get_check_payable_line()
+                    void_line, = [l for l in void_move.lines if l.party]
+                    self.assertEqual(void_line.credit, payable_line.debit)
+                    self.assertTrue(payable_line.reconciliation)
+                    self.assertEqual(
+                        payable_line.reconciliation, void_line.reconciliation
+                    )
+                for line in paid_lines:
+                    self.assertFalse(self.Line(line.id).reconciliation)
+
+                # A check can be voided only once
+                self.assertRaises(UserError, self.Move.void_checks, checks)
+
+    def test0030reissue_checks(self):
+        """
+        Reissued checks get new numbers and pay the lines again
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                paid_lines = [self.create_payable_line() for _ in range(2)]
+                checks = [self.create_check(paid_line=l) for l in paid_lines]
+                check_numbers = [c.check_number for c in checks]
+
+                void_moves, reissued_moves = self.Move.void_checks(
+                    checks, reissue=True
+                )
+
+                self.assertEqual(len(void_moves), 2)
+                self.assertEqual(len(reissued_moves), 2)
+                new_numbers = [
+                    self.Move(m.id).check_number for m in reissued_moves
+                ]
+                self.assertTrue(all(new_numbers))
+                self.assertFalse(set(new_numbers) & set(check_numbers))
+                for paid_line, reissued_move in zip(paid_lines, reissued_moves):
+                    reissued_move = self.Move(reissued_move.id)
+                    self.assertFalse(reissued_move.voided_check)
+                    self.assertEqual(
+                        self.Line(paid_line.id).reconciliation,
+                        reissued_move.get_check_payable_line().reconciliation
+                    )
+
+    def test0040void_unposted_check(self):
+        """
+        Only posted checks with a number can be voided
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                check = self.create_check()
+                self.Move.write([check], {'check_number': None})
+                self.assertRaises(
+                    UserError, self.Move.void_checks, [self.Move(check.id)]
+                )
+
+    def test0050void_cleared_check(self):
+        """
+        Checks cleared by the bank can not be voided
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                check = self.create_check(
+                    paid_line=self.create_payable_line()
+                )
+                self.Move.mark_checks_cleared(
+                    [check.id], datetime.date.today()
+                )
+                self.assertRaises(
+                    UserError, self.Move.void_checks, [self.Move(check.id)]
+                )
+                self.assertRaises(
+                    UserError, self.Move.void_checks, [self.Move(check.id)],
+                    reissue=True
+                )
+
+    def test0060match_cleared_checks(self):
+        """
+        Cleared items are matched on the numeric part of check numbers
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                self.Sequence.write([self.check_sequence], {
+                    'prefix': 'CHK-',
+                    'padding': 4,
+                })
+                check1 = self.create_check()
+                check2 = self.create_check(amount=Decimal('50'))
+                check3 = self.create_check()
+                check4 = self.create_check()
+                self.assertEqual(check1.check_number, 'CHK-0001')
+
+                # Numbers colliding once normalized
+                self.Move.write([check3], {'check_number': '007'})
+                self.Move.write([check4], {'check_number': '7'})
+
+                move_ids, mismatches = self.Move.match_cleared_checks(
+                    self.cash_journal.id, [
+                        ['0001', '100.00'],
+                        ['2', '60'],
+                        ['1', '100'],
+                        ['99', '100'],
+                        ['7', '100'],
+                        [],
+                        ['bad'],
+                    ]
+                )
+                self.assertEqual(move_ids, [check1.id])
+                self.assertEqual(len(mismatches), 5)
+                self.assertTrue(mismatches[0].startswith('Line 2:'))
+                self.assertIn('repeated', mismatches[1])
+                self.assertIn('not outstanding', mismatches[2])
+                self.assertIn('several', mismatches[3])
+                self.assertEqual(mismatches[4], 'Line 7: Invalid line')
+
+                self.Move.mark_checks_cleared(
+                    move_ids, datetime.date.today()
+                )
+                check1 = self.Move(check1.id)
+                self.assertTrue(check1.check_cleared)
+                self.assertEqual(
+                    check1.check_cleared_date, datetime.date.today()
+                )
+
+                # Cleared checks are no more outstanding
+                move_ids, mismatches = self.Move.match_cleared_checks(
+                    self.cash_journal.id, [['1', '100'], ['2', '50']]
+                )
+                self.assertEqual(move_ids, [check2.id])
+                self.assertIn('not outstanding', mismatches[0])
+
+    def test0070render_checks(self):
+        """
+        A batch of checks is rendered with the prefetched check details
+        """
+        CheckPrinting = POOL.get(
+            'account.move.check_printing', type='report'
+        )
+
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                paid_line = self.create_payable_line()
+                checks = [
+                    self.create_check(paid_line=paid_line),
+                    self.create_check(),
+                ]
+
+                moves, check_details = CheckPrinting.prefetch(checks)
+                self.assertEqual(moves, checks)
+                for check in checks:
+                    details = check_details[check.id]
+                    debit_line, = details['debit_lines']
+                    self.assertEqual(debit_line.debit, Decimal('100'))
+                    self.assertEqual(details['party'], self.supplier)
+                    self.assertEqual(
+                        details['address'].street, '1 Main Street'
+                    )
+                    for line in check.lines:
+                        self.assertEqual(
+                            details['origin_details'][line.id],
+                            line.origin_details()
+                        )
+
+                ids = map(int, checks)
+                result = CheckPrinting.execute(ids, {'moves': ids})
+                self.assertEqual(result[0], 'odt')
+                self.assertTrue(result[1])
+
+    def test0080check_eligible_lines(self):
+        """
+        Only open payable lines with a party can be paid by a check
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                open_line = self.create_payable_line()
+                expense_line, = [
+                    l for l in open_line.move.lines if not l.party
+                ]
+                paid_line = self.create_payable_line()
+                check = self.create_check(paid_line=paid_line)
+                unpaid_check = self.create_check()
+                check_line = unpaid_check.get_check_payable_line()
+
+                self.assertEqual(
+                    self.Line.get_check_eligible_lines([
+                        open_line.id, expense_line.id, paid_line.id,
+                        check.get_check_payable_line().id, check_line.id,
+                    ]),
+                    set([open_line.id])
+                )
+                self.assertEqual(self.Line.get_check_eligible_lines([]), set())
+
+    def test0090check_number_value(self):
+        """
+        The numeric part of check numbers is stored when it fits
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                self.assertEqual(
+                    self.Move.get_check_number_value('CHK-0001'), 1
+                )
+                self.assertEqual(
+                    self.Move.get_check_number_value('2014/0007'), 7
+                )
+                self.assertEqual(
+                    self.Move.get_check_number_value('ABC'), None
+                )
+                self.assertEqual(
+                    self.Move.get_check_number_value('20140000000001'), None
+                )
+
+                check = self.create_check()
+                self.Move.write([check], {'check_number': '20140000000001'})
+                self.assertEqual(
+                    self.Move(check.id).check_number_value, None
+                )
+                self.Move.write([check], {'check_number': 'CHK-0042'})
+                self.assertEqual(self.Move(check.id).check_number_value, 42)
+
+    @unittest.skipUnless(
+        WINDOW_FUNCTIONS, 'SQLite 3.25 is required for window functions'
+    )
+    def test0100check_audit(self):
+        """
+        The audit lists gaps, duplicates and out of sequence checks
+        """
+        CheckAudit = POOL.get('account.move.check_audit')
+
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                checks = [self.create_check() for _ in range(5)]
+                for check, number in zip(checks, ['1', '2', '5', '5', '3']):
+                    self.Move.write([check], {'check_number': number})
+
+                audits = dict(
+                    (a.move.id, a) for a in CheckAudit.search([
+                        ('journal', '=', self.cash_journal.id),
+                    ])
+                )
+                self.assertEqual(
+                    set(audits), set(c.id for c in checks[2:])
+                )
+
+                # 4 is missing before the first 5
+                audit = audits[checks[2].id]
+                self.assertEqual(audit.previous_number, 3)
+                self.assertEqual(audit.missing, 1)
+                self.assertEqual(audit.duplicates, 2)
+                self.assertFalse(audit.out_of_sequence)
+
+                audit = audits[checks[3].id]
+                self.assertEqual(audit.missing, 0)
+                self.assertEqual(audit.duplicates, 2)
+                self.assertFalse(audit.out_of_sequence)
+
+                # 3 is issued after 5
+                audit = audits[checks[4].id]
+                self.assertEqual(audit.missing, 0)
+                self.assertEqual(audit.duplicates, 1)
+                self.assertTrue(audit.out_of_sequence)
+
+    def test0110on_change_journal(self):
+        """
+        The journal on_change works on new moves
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                move = self.Move(journal=self.cash_journal)
+                self.assertEqual(move.on_change_journal(), {
+                    'enable_check_printing': True,
+                })
+
+                move = self.Move(journal=self.expense_journal)
+                self.assertEqual(move.on_change_journal(), {
+                    'enable_check_printing': False,
+                })
+
+    def create_check_journal(self, code, prefix, check_template):
+        """
+        Create a check journal with its own check number sequence
+        """
+        sequence, = self.Sequence.create([{
+            'name': 'Check Number %s' % code,
+            'code': 'account.journal',
+            'prefix': prefix,
+        }])
+        journal, = self.Journal.create([{
+            'name': 'Bank %s' % code,
+            'code': code,
+            'type': 'cash',
+            'sequence': self.cash_journal.sequence.id,
+            'credit_account': self.cash.id,
+            'debit_account': self.cash.id,
+            'enable_check_printing': True,
+            'check_number_sequence': sequence.id,
+            'check_template': check_template,
+        }])
+        return journal
+
+    def test0120print_checks_of_several_journals(self):
+        """
+        Checks of several journals are numbered and printed in one run
+        """
+        ActionReport = POOL.get('ir.action.report')
+        CheckPrinting = POOL.get(
+            'account.move.check_printing', type='report'
+        )
+        CheckPrintingWizard = POOL.get(
+            'account.move.check_printing_wizard', type='wizard'
+        )
+
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            with Transaction().set_context(company=self.company.id):
+                other_template, = ActionReport.create([{
+                    'name': 'Other Check',
+                    'model': 'account.move',
+                    'report_name': 'account.move.check',
+                    'report': 'account_check/reports/check.odt',
+                }])
+                # Shares the check template of the cash journal
+                journal2 = self.create_check_journal(
+                    'BANK/2', 'B-',
+                    self.ModelData.get_id('account_check', 'check_report')
+                )
+                journal3 = self.create_check_journal(
+                    'BANK/3', 'C-', other_template.id
+                )
+
+                moves = [
+                    self.create_check(journal=journal, number=False)
+                    for journal in [self.cash_journal, journal2, journal3]
+                ]
+                move_ids = map(int, moves)
+
+                session_id, _, _ = CheckPrintingWizard.create()
+                wizard = CheckPrintingWizard(session_id)
+                with Transaction().set_context(active_ids=move_ids):
+                    defaults = wizard.default_start(None)
+                    self.assertEqual(defaults['journals'], [
+                        self.cash_journal.id, journal2.id, journal3.id,
+                    ])
+                    self.assertEqual(defaults['no_of_checks'], 3)
+                    self.assertNotIn('journal', defaults)
+                    self.assertEqual(
+                        defaults['next_numbers'].splitlines(), [
+                            '%s: 1' % self.cash_journal.rec_name,
+                            '%s: 1' % journal2.rec_name,
+                            '%s: 1' % journal3.rec_name,
+                        ]
+                    )
+
+                    _, data = wizard.do_generate({})
+                self.assertEqual(data, {'moves': move_ids})
+
+                # Each journal numbers its checks from its own sequence
+                self.assertEqual(
+                    [self.Move(m).check_number for m in move_ids],
+                    ['1', 'B-1', 'C-1']
+                )
+
+                # A shared template gives a single document
+                ids = move_ids[:2]
+                result = CheckPrinting.execute(ids, {'moves': ids})
+                self.assertEqual(result[0], 'odt')
+
+                # Different templates give one document by template
+                result = CheckPrinting.execute(
+                    move_ids, {'moves': move_ids}
+                )
+                self.assertEqual(result[0], 'zip')
+                archive = zipfile.ZipFile(StringIO(str(result[1])))
+                self.assertEqual(archive.namelist(), [
+                    '1-%s-BANK_2.odt' % self.cash_journal.code,
+                    '2-BANK_3.odt',
+                ])
+
+    def get_cached_configuration(self, journal, company):
+        """
+        Return the check configuration of the journal in the cache
+        """
+        return self.Journal._check_configuration_cache.get(
+            (journal.id, company)
+        )
+
+    def test0130check_configuration_cache(self):
+        """
+        The check configuration cache is cleared when journals change
+        """
+        ActionReport = POOL.get('ir.action.report')
+
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            company = self.company.id
+            with Transaction().set_context(company=company):
+                journal = self.cash_journal
+
+                configuration = self.Journal.get_check_configuration(
+                    journal.id
+                )
+                self.assertTrue(configuration.enable_check_printing)
+                self.assertEqual(
+                    self.get_cached_configuration(journal, company),
+                    configuration
+                )
+
+                other_template, = ActionReport.create([{
+                    'name': 'Other Check',
+                    'model': 'account.move',
+                    'report_name': 'account.move.check',
+                    'report': 'account_check/reports/check.odt',
+                }])
+                self.Journal.write([journal], {
+                    'check_template': other_template.id,
+                })
+                self.assertEqual(
+                    self.get_cached_configuration(journal, company), None
+                )
+                self.assertEqual(
+                    self.Journal.get_check_configuration(
+                        journal.id
+                    ).check_template,
+                    other_template.id
+                )
+
+                self.Journal.write([journal], {
+                    'enable_check_printing': False,
+                })
+                self.assertFalse(
+                    self.Journal.get_check_configuration(
+                        journal.id
+                    ).enable_check_printing
+                )
+
+    def test0140check_configuration_cache_properties(self):
+        """
+        The check configuration cache is cleared only by journal
+        properties
+        """
+        Property = POOL.get('ir.property')
+
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            company = self.company.id
+            with Transaction().set_context(company=company):
+                journal = self.cash_journal
+                res = 'account.journal,%d' % journal.id
+
+                # Properties of other models keep the cache
+                self.Journal.get_check_configuration(journal.id)
+                payable_properties = Property.search([
+                    ('field.model.model', '=', 'party.party'),
+                    ('field.name', '=', 'account_payable'),
+                ])
+                self.assertTrue(payable_properties)
+                Property.write(payable_properties, {
+                    'value': 'account.account,%d' % self.payable.id,
+                })
+                self.assertTrue(
+                    self.get_cached_configuration(journal, company)
+                )
+
+                # check_number_sequence is stored in ir.property
+                sequence, = self.Sequence.create([{
+                    'name': 'Other Check Number',
+                    'code': 'account.journal',
+                }])
+                properties = Property.search([
+                    ('field.model.model', '=', 'account.journal'),
+                    ('field.name', '=', 'check_number_sequence'),
+                    ('res', '=', res),
+                ])
+                self.assertTrue(properties)
+                Property.write(properties, {
+                    'value': 'ir.sequence,%d' % sequence.id,
+                })
+                self.assertEqual(
+                    self.get_cached_configuration(journal, company), None
+                )
+                self.assertEqual(
+                    self.Journal.get_check_configuration(
+                        journal.id
+                    ).check_number_sequence,
+                    sequence.id
+                )
+
+                # credit_account is stored in ir.property
+                account = self._get_account_by_kind('expense')
+                properties = Property.search([
+                    ('field.model.model', '=', 'account.journal'),
+                    ('field.name', '=', 'credit_account'),
+                    ('res', '=', res),
+                ])
+                self.assertTrue(properties)
+                Property.write(properties, {
+                    'value': 'account.account,%d' % account.id,
+                })
+                self.assertEqual(
+                    self.get_cached_configuration(journal, company), None
+                )
+                self.assertEqual(
+                    self.Journal.get_check_configuration(
+                        journal.id
+                    ).credit_account,
+                    account.id
+                )
+
+                # Deleting a journal property clears the cache as well
+                self.Journal.get_check_configuration(journal.id)
+                Property.delete(properties)
+                self.assertEqual(
+                    self.get_cached_configuration(journal, company), None
+                )
+
+    def test0150check_configuration_cache_company(self):
+        """
+        The check configuration is cached by company
+        """
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.setup_defaults()
+
+            company = self.company.id
+            journal = self.cash_journal
+            with Transaction().set_context(company=company):
+                configuration = self.Journal.get_check_configuration(
+                    journal.id
+                )
+            with Transaction().set_context(company=None):
+                default_configuration = (
+                    self.Journal.get_check_configuration(journal.id)
+                )
+
+            # The sequence set for the company is a company property,
+            # without company the default property of the module is used
+            self.assertEqual(
+                configuration.check_number_sequence, self.check_sequence.id
+            )
+            self.assertEqual(
+                default_configuration.check_number_sequence,
+                self.ModelData.get_id(
+                    'account_check', 'sequence_check_number'
+                )
+            )
+            self.assertEqual(
+                self.get_cached_configuration(journal, company),
+                configuration
+            )
+            self.assertEqual(
+                self.get_cached_configuration(journal, None),
+                default_configuration
+            )
+
+
+def suite():
+    """
+    Define suite
+    """
+    test_suite = trytond.tests.test_tryton.suite()
+    test_suite.addTests(
+        unittest.TestLoader().loadTestsFromTestCase(TestCheck)
+    )
+    return test_suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())